@@ -1,33 +1,242 @@
 import pandas as pd
+import numpy as np
 import os
+import functools
+import warnings
+from pathlib import Path
 from datetime import datetime, timedelta
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import matplotlib.pyplot as plt
 
-# Set default theme for all plots
-px.defaults.template = "plotly_dark"
+# Reduction applied to each activity column in summary_stats (NaN-skipping like pandas)
+AGG_SPEC = {
+    'distance': np.nansum,
+    'total_elevation_gain': np.nansum,
+    'moving_time': np.nansum,
+    'average_heartrate': np.nanmean,
+    'max_heartrate': np.nanmax,
+    'average_speed': np.nanmean,
+    'max_speed': np.nanmax,
+    'average_watts': np.nanmean,
+    'max_watts': np.nanmax,
+}
+
+# Display format spec for each summary_stats entry (counts as integers, the rest to 2 decimals)
+STAT_FORMATS = {
+    'total_activities': '',
+    'activities_past_week': '',
+    'total_distance_km': '.2f',
+    'total_elevation_m': '.2f',
+    'total_moving_time_h': '.2f',
+    'avg_heartrate': '.2f',
+    'max_heartrate': '.2f',
+    'avg_speed_kmh': '.2f',
+    'max_speed_kmh': '.2f',
+    'avg_watts': '.2f',
+    'max_watts': '.2f',
+}
+
+# One "key: value" line per stat, rendered with SUMMARY_TEMPLATE.format(**stats)
+SUMMARY_TEMPLATE = "\n".join(f"{key}: {{{key}:{spec}}}" for key, spec in STAT_FORMATS.items())
+
+# Activity columns narrowed after loading, halving the memory the aggregations stream through
+FLOAT32_COLUMNS = ('distance', 'total_elevation_gain', 'average_heartrate', 'max_heartrate', 'average_speed')
+INT32_COLUMNS = ('moving_time', 'elapsed_time')  # in seconds
+
+
+FIG_DIR = Path('data/figures')
+
+
+@functools.lru_cache(maxsize=None)
+def _ensure_fig_dir():
+    """Create the figures directory once per process and return it"""
+    FIG_DIR.mkdir(parents=True, exist_ok=True)
+    return FIG_DIR
+
+
+def _to_datetime64(dates):
+    """Return a date column as a naive datetime64 array (UTC if tz-aware)"""
+    if getattr(dates.dtype, 'tz', None) is not None:
+        dates = dates.dt.tz_convert(None)
+    return dates.to_numpy()
+
+
+def _daily_rolling(dates, values, window=7):
+    """Sum values per calendar day and compute a trailing rolling mean
+    
+    Equivalent to resample('D').sum() followed by rolling(window).mean(), done
+    with one bincount and one cumulative sum.
+    """
+    valid = ~np.isnat(dates)
+    if not valid.any():
+        return np.array([], dtype='datetime64[D]'), np.array([]), np.array([])
+    
+    day_idx = dates[valid].astype('datetime64[D]').astype(np.int64)
+    first_day = day_idx.min()
+    daily = np.bincount(day_idx - first_day, weights=np.nan_to_num(values[valid]))
+    days = np.arange(first_day, first_day + len(daily)).astype('datetime64[D]')
+    
+    # Window sums from the prefix sum; the first window-1 days have no full window
+    cumsum = np.concatenate(([0.0], np.cumsum(daily)))
+    rolling = np.full(len(daily), np.nan)
+    rolling[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    
+    return days, daily, rolling
+
+
+def _prepare_activities(df):
+    """Normalize column types of an activities DataFrame for analysis"""
+    # Convert date string to datetime (Strava dates are ISO 8601, parsed on the fast path as UTC)
+    if 'start_date_local' in df.columns:
+        df['start_date_local'] = pd.to_datetime(df['start_date_local'], format='ISO8601', utc=True)
+    
+    # Few distinct activity types, so compare on category codes instead of strings
+    if 'type' in df.columns:
+        df['type'] = df['type'].astype('category')
+    
+    # Downcast numeric columns; durations stay 64-bit if they have gaps (NaN is not an int32)
+    for col in FLOAT32_COLUMNS:
+        if col in df.columns and df[col].dtype.kind == 'f':
+            df[col] = df[col].astype(np.float32)
+    for col in INT32_COLUMNS:
+        if col in df.columns and df[col].dtype.kind == 'i':
+            df[col] = df[col].astype(np.int32)
+    
+    return df
+
+
+def _weekly_distance(df):
+    """Weekly distance in km, or None when there is less than a month of data"""
+    # Only show weekly distance if we have at least 1 month of data
+    dates = _to_datetime64(df['start_date_local'])
+    valid = ~np.isnat(dates)
+    dates = dates[valid]
+    if len(dates) == 0 or (dates.max() - dates.min()) / np.timedelta64(1, 'D') < 30:
+        return None
+    
+    # Sum distances per Monday-Sunday week with one bincount, labelled by the Sunday like resample('W')
+    day_idx = dates.astype('datetime64[D]').astype(np.int64)
+    week_idx = (day_idx + 3) // 7  # 1970-01-01 was a Thursday, so shift weeks to start on Monday
+    first_week = week_idx.min()
+    distances = df['distance'].to_numpy(dtype=np.float64, na_value=np.nan)[valid]
+    weekly_distance = np.bincount(week_idx - first_week, weights=np.nan_to_num(distances)) / 1000  # m -> km
+    weeks = (np.arange(first_week, first_week + len(weekly_distance)) * 7 + 3).astype('datetime64[D]')
+    return weeks, weekly_distance
+
+
+def _training_load(df):
+    """Daily training load and its 7-day average, or None without heart rate data"""
+    if len(df) == 0 or 'average_heartrate' not in df.columns or 'moving_time' not in df.columns:
+        return None
+    
+    # Calculate a simple training load score (moving time * average heart rate)
+    training_load = df['moving_time'].to_numpy(dtype=np.float64) * df['average_heartrate'].to_numpy(dtype=np.float64)
+    training_load /= 3600  # Normalize by hour
+    
+    # Sum by day and calculate 7-day rolling average
+    return _daily_rolling(_to_datetime64(df['start_date_local']), training_load)
+
+
+# Frames already loaded in this process, as {data_file: (CSV mtime_ns, DataFrame)}
+_loaded_activities = {}
+
+
+def _read_cache(cache_file, csv_mtime):
+    """Return the cached frame if it is at least as new as the CSV and readable, else None"""
+    try:
+        if os.stat(cache_file).st_mtime_ns < csv_mtime:
+            return None
+        return pd.read_pickle(cache_file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # Truncated file or a pickle from an incompatible pandas; the caller rebuilds it from the CSV
+        print(f"Warning: Ignoring unreadable activities cache {cache_file}: {e}")
+        return None
+
+
+def _write_cache(df, cache_file):
+    """Pickle a prepared frame next to the CSV, via a temporary file so readers never see a partial one"""
+    tmp_file = cache_file + '.tmp'
+    try:
+        df.to_pickle(tmp_file)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"Warning: Could not write activities cache {cache_file}: {e}")
+
+
+def load_activities(data_file='data/activities.csv'):
+    """Load activities from CSV, using a binary cache when it is up to date"""
+    # Reuse a frame loaded earlier in this process while the CSV is unchanged
+    csv_mtime = os.stat(data_file).st_mtime_ns
+    loaded = _loaded_activities.get(data_file)
+    if loaded is not None and loaded[0] == csv_mtime:
+        return loaded[1].copy(deep=False)
+    
+    # The cache sits next to the CSV and is only trusted if it is at least as new
+    cache_file = os.path.splitext(data_file)[0] + '.pkl'
+    df = _read_cache(cache_file, csv_mtime)
+    if df is None:
+        df = _prepare_activities(pd.read_csv(data_file))
+        _write_cache(df, cache_file)
+    
+    _loaded_activities[data_file] = (csv_mtime, df)
+    return df.copy(deep=False)
+
+
+def save_activities(df, data_file='data/activities.csv'):
+    """Save activities to CSV and refresh the binary cache used by load_activities"""
+    os.makedirs(os.path.dirname(data_file) or '.', exist_ok=True)
+    df.to_csv(data_file, index=False)
+    
+    # Written after the CSV, so the next load_activities takes the cache instead of reparsing
+    cache_file = os.path.splitext(data_file)[0] + '.pkl'
+    _write_cache(_prepare_activities(df.copy(deep=False)), cache_file)
+
 
 class ActivityAnalyzer:
-    def __init__(self, data_file='data/activities.csv'):
-        """Initialize the analyzer with a data file"""
-        if os.path.exists(data_file):
-            self.df = pd.read_csv(data_file)
-            # Convert date string to datetime
-            if 'start_date_local' in self.df.columns:
-                self.df['start_date_local'] = pd.to_datetime(self.df['start_date_local'])
+    def __init__(self, data_file='data/activities.csv', df=None):
+        """Initialize the analyzer with a data file or an already loaded DataFrame"""
+        if df is not None:
+            # Shallow copy so type normalization does not touch the caller's frame
+            self.df = _prepare_activities(df.copy(deep=False))
+        elif os.path.exists(data_file):
+            self.df = load_activities(data_file)
             print(f"Loaded {len(self.df)} activities from {data_file}")
         else:
             self.df = None
             print(f"Data file {data_file} not found")
+        
+        # Derived plot series, keyed by (compute function, DataFrame id, activity type) and stored
+        # with the frame they were computed from, so a reused id is not mistaken for a hit
+        self._series_cache = {}
+        # Activities split by type in one pass, as (DataFrame, {type: frame}); holding the frame
+        # itself means a reassigned self.df can never match a stale partition through a reused id
+        self._by_type = (None, {})
+        # summary_stats results by DataFrame id, holding the frame so its id is not reused
+        self._stats_cache = {}
+    
+    def _derived(self, compute, activity_type):
+        """Return compute(filtered df), evaluated once per DataFrame and activity type"""
+        key = (compute.__name__, id(self.df), activity_type)
+        cached = self._series_cache.get(key)
+        if cached is None or cached[0] is not self.df:
+            df = self.filter_activity_type(activity_type) if activity_type else self.df
+            cached = self._series_cache[key] = (self.df, compute(df))
+        return cached[1]
     
     def filter_activity_type(self, activity_type='Ride'):
         """Filter activities by type"""
         if self.df is None:
             return None
         
-        return self.df[self.df['type'] == activity_type]
+        # Partition once per DataFrame instead of scanning the type column on every call
+        partitioned_df, by_type = self._by_type
+        if partitioned_df is not self.df:
+            by_type = {key: group for key, group in self.df.groupby('type', observed=True, sort=False)}
+            self._by_type = (self.df, by_type)
+        
+        if activity_type in by_type:
+            return by_type[activity_type]
+        return self.df.iloc[0:0]
     
     def summary_stats(self, df=None):
         """Calculate summary statistics for activities"""
@@ -38,64 +247,63 @@ class ActivityAnalyzer:
             print("No activities available for analysis")
             return None
         
+        cached = self._stats_cache.get(id(df))
+        if cached is not None and cached[0] is df:
+            return dict(cached[1])
+        
         # Weekly summary
-        today = datetime.now()
-        week_ago = today - timedelta(days=7)
+        week_ago = np.datetime64(datetime.now() - timedelta(days=7))
         
-        # Handle timezone-aware datetime comparison
+        # Count recent activities on the raw date array rather than filtering the frame
         if 'start_date_local' in df.columns:
-            # Convert to pandas Timestamp for consistent handling
-            week_ago_ts = pd.Timestamp(week_ago)
-            
-            # Check if start_date_local column has timezone info
-            if hasattr(df['start_date_local'].dtype, 'tz') and df['start_date_local'].dtype.tz is not None:
-                # Convert week_ago to timezone-aware
-                week_ago_ts = week_ago_ts.tz_localize('UTC')
-            
-            # Filter data
-            week_df = df[df['start_date_local'] >= week_ago_ts]
+            activities_past_week = int((_to_datetime64(df['start_date_local']) >= week_ago).sum())
         else:
-            week_df = pd.DataFrame()  # Empty dataframe if no date column
+            activities_past_week = 0
+        
+        # Reduce each available column directly on its NumPy array
+        with warnings.catch_warnings():
+            # All-NaN columns (e.g. rides without a power meter) reduce to NaN, as in pandas
+            warnings.simplefilter('ignore', RuntimeWarning)
+            totals = {
+                col: func(df[col].to_numpy(dtype=np.float64, na_value=np.nan))
+                for col, func in AGG_SPEC.items() if col in df.columns
+            }
         
         stats = {
             'total_activities': len(df),
-            'activities_past_week': len(week_df),
-            'total_distance_km': df['distance'].sum() / 1000 if 'distance' in df.columns else 0,
-            'total_elevation_m': df['total_elevation_gain'].sum() if 'total_elevation_gain' in df.columns else 0,
-            'total_moving_time_h': df['moving_time'].sum() / 3600 if 'moving_time' in df.columns else 0,
-            'avg_heartrate': df['average_heartrate'].mean() if 'average_heartrate' in df.columns else 0,
-            'max_heartrate': df['max_heartrate'].max() if 'max_heartrate' in df.columns else 0,
-            'avg_speed_kmh': (df['average_speed'].mean() * 3.6) if 'average_speed' in df.columns else 0,
-            'max_speed_kmh': (df['max_speed'].max() * 3.6) if 'max_speed' in df.columns else 0,
-            'avg_watts': df['average_watts'].mean() if 'average_watts' in df.columns else 0,
-            'max_watts': df['max_watts'].max() if 'max_watts' in df.columns else 0,
+            'activities_past_week': activities_past_week,
+            'total_distance_km': totals.get('distance', 0) / 1000,
+            'total_elevation_m': totals.get('total_elevation_gain', 0),
+            'total_moving_time_h': totals.get('moving_time', 0) / 3600,
+            'avg_heartrate': totals.get('average_heartrate', 0),
+            'max_heartrate': totals.get('max_heartrate', 0),
+            'avg_speed_kmh': totals.get('average_speed', 0) * 3.6,
+            'max_speed_kmh': totals.get('max_speed', 0) * 3.6,
+            'avg_watts': totals.get('average_watts', 0),
+            'max_watts': totals.get('max_watts', 0),
         }
         
-        return stats
+        self._stats_cache[id(df)] = (df, stats)
+        return dict(stats)
     
     def plot_weekly_distance(self, activity_type=None):
         """Plot weekly distance for activities"""
         if self.df is None:
             return
         
-        df = self.filter_activity_type(activity_type) if activity_type else self.df
-        
-        # Only show weekly distance if we have at least 1 month of data
-        if (pd.to_datetime(df['start_date_local'].max()) - pd.to_datetime(df['start_date_local'].min())).days < 30:
+        weekly_distance = self._derived(_weekly_distance, activity_type)
+        if weekly_distance is None:
             return
-            
-        # Convert to datetime and set as index
-        df['start_date_local'] = pd.to_datetime(df['start_date_local'])
-        df.set_index('start_date_local', inplace=True)
+        weeks, distances = weekly_distance
         
-        # Resample to weekly and sum distances
-        weekly_distance = df['distance'].resample('W').sum()
+        # Plotly is only imported when a figure is actually built
+        import plotly.graph_objects as go
         
         # Create the plot
         fig = go.Figure()
         fig.add_trace(go.Bar(
-            x=weekly_distance.index,
-            y=weekly_distance.values,
+            x=weeks,
+            y=distances,
             name='Weekly Distance'
         ))
         
@@ -109,8 +317,7 @@ class ActivityAnalyzer:
         )
         
         # Save the plot
-        os.makedirs('data/figures', exist_ok=True)
-        fig.write_html('data/figures/weekly_distance.html')
+        fig.write_html(_ensure_fig_dir() / 'weekly_distance.html')
     
     def plot_heartrate_zones(self, activity_type=None):
         """Plot heart rate zones for activities"""
@@ -122,37 +329,27 @@ class ActivityAnalyzer:
         if self.df is None:
             return
         
-        df = self.filter_activity_type(activity_type) if activity_type else self.df
+        load = self._derived(_training_load, activity_type)
         
-        if df is None or len(df) == 0:
-            return
-        
-        # Calculate a simple training load score (moving time * average heart rate)
-        if 'average_heartrate' in df.columns and 'moving_time' in df.columns:
-            df['training_load'] = df['moving_time'] * df['average_heartrate'] / 3600  # Normalize by hour
-            
-            # Resample by day
-            df = df.set_index('start_date_local')
-            daily_load = df['training_load'].resample('D').sum()
-            
-            # Calculate 7-day rolling average
-            rolling_load = daily_load.rolling(window=7).mean()
+        if load is not None:
+            days, daily_load, rolling_load = load
             
             # Create the plot
+            import plotly.graph_objects as go
             fig = go.Figure()
             
             # Add daily load bars
             fig.add_trace(go.Bar(
-                x=daily_load.index,
-                y=daily_load.values,
+                x=days,
+                y=daily_load,
                 name='Daily Load',
                 opacity=0.6
             ))
             
             # Add 7-day average line
             fig.add_trace(go.Scatter(
-                x=rolling_load.index,
-                y=rolling_load.values,
+                x=days,
+                y=rolling_load,
                 name='7-Day Average',
                 line=dict(color='red', width=2)
             ))
@@ -167,5 +364,4 @@ class ActivityAnalyzer:
             )
             
             # Save the plot
-            os.makedirs('data/figures', exist_ok=True)
-            fig.write_html('data/figures/training_load.html')
\ No newline at end of file
+            fig.write_html(_ensure_fig_dir() / 'training_load.html')
\ No newline at end of file
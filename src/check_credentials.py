@@ -1,6 +1,10 @@
 import os
 from dotenv import load_dotenv
 
+def _mask(value, pad='*' * 20, n=4):
+    """Mask a credential, keeping only its last n characters"""
+    return f"{pad}{value[-n:]}" if value else 'Not set'
+
 def check_credentials():
     """Check and print the current Strava API credentials"""
     # Try to load from .env file
@@ -17,6 +21,6 @@ def check_credentials():
     refresh_token = os.getenv('STRAVA_REFRESH_TOKEN')
     
     print("\nStrava API Credentials:")
-    print(f"STRAVA_CLIENT_ID: {'*****' + client_id[-4:] if client_id else 'Not set'}")
-    print(f"STRAVA_CLIENT_SECRET: {'*' * 20 + client_secret[-4:] if client_secret else 'Not set'}")
-    print(f"STRAVA_REFRESH_TOKEN: {'*' * 20 + refresh_token[-4:] if refresh_token else 'Not set'}")
\ No newline at end of file
+    print(f"STRAVA_CLIENT_ID: {_mask(client_id, pad='*' * 5)}")
+    print(f"STRAVA_CLIENT_SECRET: {_mask(client_secret)}")
+    print(f"STRAVA_REFRESH_TOKEN: {_mask(refresh_token)}")
\ No newline at end of file
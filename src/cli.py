@@ -7,12 +7,41 @@ the core functionality of the CyclingCoach application.
 
 import os
 import sys
-import json
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import click
 
-from src import strava_api, analyzer, detailed_activity
-from src.strava_auth import main as authenticate
+# The src modules pull in pandas, numpy, plotly and requests, so each command
+# imports only what it uses to keep `coach --help`, `setup` and `auth` fast.
+
+
+# Strava credentials written by `coach auth`
+ENV_PATH = Path('config') / '.env'
+
+# Records which activities CSV and type the basic plots were last drawn from (first line),
+# followed by the names of the figure files that drawing wrote
+FIGURES_FINGERPRINT = Path('data/figures') / '.fingerprint'
+
+
+def _shared(key, factory):
+    """Return an object shared by all commands of this invocation, creating it on first use"""
+    # ctx.obj is set up by the cli group and inherited by sub-invocations such as those in `all`
+    shared = click.get_current_context().obj
+    if key not in shared:
+        shared[key] = factory()
+    return shared[key]
+
+
+def get_api():
+    """Return the shared StravaAPI (creating one refreshes the access token)"""
+    from src import strava_api
+    return _shared('api', strava_api.StravaAPI)
+
+
+def get_detailed_analyzer():
+    """Return the shared DetailedActivityAnalyzer, reusing the StravaAPI token"""
+    from src import detailed_activity
+    return _shared('detailed', lambda: detailed_activity.DetailedActivityAnalyzer(access_token=get_api().access_token))
 
 
 def setup_dirs():
@@ -31,26 +60,34 @@ def setup_dirs():
     click.echo("Directory structure created.")
 
 
+def authenticate(write=False):
+    """Run the interactive Strava OAuth flow"""
+    from src.strava_auth import main
+    main(write=write)
+
+
 def check_auth():
     """Check if authentication is configured"""
-    if not os.path.exists('config/.env'):
+    if not ENV_PATH.is_file():
         click.echo("Strava API credentials not found. Running authentication...")
         authenticate()
     else:
         click.echo("Strava API credentials found.")
-        # Test the credentials
-        api = strava_api.StravaAPI()
-        if api.access_token:
+        # Test the credentials with a request to Strava
+        if get_api().check_access():
             click.echo("Authentication successful!")
         else:
             click.echo("Authentication failed. Please re-authenticate.")
+            click.get_current_context().obj.pop('api', None)
             authenticate()
 
 
 @click.group()
-def cli():
+@click.pass_context
+def cli(ctx):
     """CyclingCoach - Analyze your Strava cycling data."""
-    pass
+    # Objects shared between the commands run in this invocation, created lazily
+    ctx.ensure_object(dict)
 
 
 @cli.command()
@@ -61,50 +98,81 @@ def setup():
 
 
 @cli.command()
-def auth():
+@click.option('--write', is_flag=True, help='Also grant write access to activities (needed by create-activity)')
+def auth(write):
     """Authenticate with Strava API."""
-    authenticate()
+    authenticate(write=write)
 
 
 @cli.command()
 @click.option('--days', default=7, help='Number of days to fetch activities for')
 @click.option('--activity_type', default=None, help='Type of activity to fetch (e.g., Ride, Run)')
-def fetch(days, activity_type):
+@click.option('--refresh', is_flag=True, help='Ignore the cached activity list and query Strava')
+def fetch(days, activity_type, refresh=False):
     """Fetch activities from Strava."""
     click.echo(f"Fetching activities from the past {days} days...")
-    api = strava_api.StravaAPI()
-    activities = api.get_activities(days=days)
-    
-    if activities:
-        click.echo(f"Retrieved {len(activities)} activities")
-        df = api.parse_activities(activities)
-        if df is not None:
-            if activity_type:
-                df = df[df['type'] == activity_type]
-                click.echo(f"Filtered to {len(df)} {activity_type} activities")
-            
-            # Save to CSV
-            os.makedirs('data', exist_ok=True)
-            df.to_csv('data/activities.csv', index=False)
-            click.echo("Activities saved to data/activities.csv")
-            return df
+    api = get_api()
+    activities = api.get_activities(days=days, use_cache=not refresh)
     
-    click.echo("No activities found.")
-    return None
+    if activities is None:
+        click.echo("No activities found.")
+        return None
+    
+    click.echo(f"Retrieved {len(activities)} activities")
+    keep_types = frozenset([activity_type]) if activity_type else None
+    df = api.parse_activities(activities, keep_types=keep_types)
+    if df is None:
+        # Nothing in the period (of this type): still replace the CSV, so later analyses
+        # don't pick up activities from an earlier fetch as if they were current
+        import pandas as pd
+        from src import strava_api
+        df = pd.DataFrame(columns=strava_api.ACTIVITY_FIELDS)
+    if activity_type:
+        click.echo(f"Filtered to {len(df)} {activity_type} activities")
+    
+    # Save to CSV
+    api.save_activities(df, 'data/activities.csv')
+    if len(df) == 0:
+        click.echo("No activities found.")
+    return df
 
 
 @cli.command()
 @click.option('--days', default=7, help='Number of days to analyze')
 @click.option('--activity_type', default='Ride', help='Type of activity to analyze (e.g., Ride, Run)')
-def basic(days, activity_type):
+@click.option('--force', is_flag=True, help='Redraw the plots even if the data has not changed')
+def basic(days, activity_type, force):
     """Run basic analysis on activities."""
+    run_basic(days, activity_type, force=force)
+
+
+def _figures_fingerprint(activity_type):
+    """Identify the basic plots by the activities CSV version and activity type, or None without a CSV"""
+    try:
+        return f"{os.stat('data/activities.csv').st_mtime_ns} {activity_type}"
+    except OSError:
+        return None
+
+
+def _figures_up_to_date(fingerprint):
+    """Whether the basic plots were drawn from this fingerprint and their files still exist"""
+    if fingerprint is None or not FIGURES_FINGERPRINT.is_file():
+        return False
+    recorded, *figures = FIGURES_FINGERPRINT.read_text().splitlines()
+    return recorded == fingerprint and all((FIGURES_FINGERPRINT.parent / name).is_file() for name in figures)
+
+
+def run_basic(days, activity_type, activities_df=None, force=False):
+    """Run basic analysis, reusing an already fetched DataFrame if given"""
+    from src import analyzer
+    
     click.echo("\nRunning basic analysis...")
     
     # Make sure we have activities data
-    if not os.path.exists('data/activities.csv'):
-        fetch(days=days, activity_type=activity_type)
+    if activities_df is None and not os.path.exists('data/activities.csv'):
+        activities_df = fetch.callback(days=days, activity_type=activity_type)
     
-    analyzer_obj = analyzer.ActivityAnalyzer()
+    analyzer_obj = analyzer.ActivityAnalyzer(df=activities_df)
     
     if analyzer_obj.df is not None:
         # Print summary statistics
@@ -116,29 +184,81 @@ def basic(days, activity_type):
         
         if stats:
             click.echo(f"\n{activity_type} Activity Summary:")
-            for key, value in stats.items():
-                click.echo(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
+            click.echo(analyzer.SUMMARY_TEMPLATE.format(**stats))
         
-        # Generate plots
-        analyzer_obj.plot_weekly_distance(activity_type=activity_type)
-        analyzer_obj.plot_heartrate_zones(activity_type=activity_type)
-        analyzer_obj.training_load_analysis(activity_type=activity_type)
+        # Skip the plots if they were already drawn from this exact CSV and activity type
+        fingerprint = _figures_fingerprint(activity_type)
+        if not force and _figures_up_to_date(fingerprint):
+            click.echo("\nVisualizations in data/figures/ are up to date (use --force to redraw).")
+            return
+        
+        # Generate plots; each builds its own figure and file. Building and serializing the plotly
+        # figures is Python code that holds the GIL, so the threads mostly overlap the file writes.
+        plots = [
+            analyzer_obj.plot_weekly_distance,
+            analyzer_obj.plot_heartrate_zones,
+            analyzer_obj.training_load_analysis,
+        ]
+        fig_dir = FIGURES_FINGERPRINT.parent
+        before = {figure.name: figure.stat().st_mtime_ns for figure in fig_dir.glob('*.html')}
+        with ThreadPoolExecutor(max_workers=len(plots)) as executor:
+            list(executor.map(lambda plot: plot(activity_type=activity_type), plots))
+        
+        if fingerprint is not None:
+            # Some plots are skipped for too little data, so record the files this run actually wrote
+            fig_dir.mkdir(parents=True, exist_ok=True)
+            written = [
+                figure.name for figure in fig_dir.glob('*.html')
+                if before.get(figure.name) != figure.stat().st_mtime_ns
+            ]
+            FIGURES_FINGERPRINT.write_text('\n'.join([fingerprint] + sorted(written)))
         
         click.echo("\nBasic analysis completed. Visualizations saved to data/figures/")
     else:
         click.echo("No activities available for analysis.")
 
 
+# Per-process state of pool workers: the parent's access token and a lazily created analyzer
+_worker_access_token = None
+_worker_analyzer = None
+
+
+def _init_worker(access_token):
+    """Pool initializer: remember the parent's access token in this worker process"""
+    global _worker_access_token
+    _worker_access_token = access_token
+
+
+def _process_one(activity_id, activity_name):
+    """Worker process entry point for a single activity"""
+    from src import detailed_activity
+    global _worker_analyzer
+    
+    # Build the analyzer once per worker and reuse it for every activity it picks up.
+    # Reusing the parent's token means workers don't each refresh it and rewrite the .env file.
+    if _worker_analyzer is None:
+        _worker_analyzer = detailed_activity.DetailedActivityAnalyzer(access_token=_worker_access_token)
+    
+    return _worker_analyzer.process_activity(activity_id, activity_name)
+
+
 @cli.command()
 @click.option('--activity_id', default=None, help='Specific activity ID to analyze')
 @click.option('--days', default=7, help='Number of days to analyze')
 @click.option('--activity_type', default=None, help='Type of activity to analyze (e.g., Ride, Run)')
 @click.option('--all', is_flag=True, help='Process all activities in range')
-def detailed(activity_id, days, activity_type, all):
+@click.option('--workers', default=4, help='Worker processes for --all (1 to process serially)')
+@click.option('--force', is_flag=True, help='With --all, also reprocess activities that already have an analysis')
+def detailed(activity_id, days, activity_type, all, workers, force):
     """Run detailed analysis on activities."""
+    run_detailed(activity_id, days, activity_type, all, workers, force=force)
+
+
+def run_detailed(activity_id, days, activity_type, all, workers=4, force=False, activities_df=None):
+    """Run detailed analysis, reusing an already fetched DataFrame if given"""
     click.echo("\nRunning detailed analysis...")
     
-    detailed_analyzer = detailed_activity.DetailedActivityAnalyzer()
+    detailed_analyzer = get_detailed_analyzer()
     
     if activity_id:
         # Process a specific activity
@@ -147,48 +267,78 @@ def detailed(activity_id, days, activity_type, all):
         
         if activity_data and streams_df is not None:
             analysis = detailed_analyzer.analyze_streams(streams_df, activity_data)
-            if analysis:
-                # Save analysis to JSON
-                analysis_path = f'data/detailed/{activity_id}_analysis.json'
-                with open(analysis_path, 'w') as f:
-                    json.dump(analysis, f, cls=detailed_activity.NumpyEncoder)
-                click.echo(f"Analysis saved to {analysis_path}")
             
             # Generate visualizations
-            detailed_analyzer.generate_activity_visualizations(activity_id, activity_data.get('name', 'Activity'), streams_df)
+            detailed_analyzer.generate_activity_visualizations(activity_id, activity_data.get('name', 'Activity'), streams_df, analysis)
+            
+            if analysis:
+                # Save analysis to JSON after the visualizations, as `--all` treats it as the completion marker
+                analysis_path = detailed_analyzer.save_analysis(activity_id, analysis)
+                click.echo(f"Analysis saved to {analysis_path}")
             click.echo(f"Detailed analysis for activity {activity_id} completed.")
     else:
         # Process multiple activities
-        activities_df = detailed_analyzer.get_activities(days=days, activity_type=activity_type)
+        if activities_df is None:
+            activities_df = detailed_analyzer.get_activities(days=days, activity_type=activity_type)
         
         if activities_df is not None and len(activities_df) > 0:
             click.echo(f"Found {len(activities_df)} activities to process")
             
+            # Pull the columns out once; ids as int64 so large Strava ids never go through float
+            ids = activities_df['id'].astype('int64').to_numpy()
+            names = activities_df['name'].to_numpy(object)
+            
             if all:
                 # Process all activities
-                for idx, row in activities_df.iterrows():
-                    activity_id = str(int(row['id']))
-                    click.echo(f"Processing activity {idx+1}/{len(activities_df)}: {activity_id} - {row['name']}")
-                    activity_data, streams_df = detailed_analyzer.process_activity_data(activity_id)
-                    
-                    if activity_data and streams_df is not None:
-                        analysis = detailed_analyzer.analyze_streams(streams_df, activity_data)
-                        if analysis:
-                            # Save analysis to JSON
-                            analysis_path = f'data/detailed/{activity_id}_analysis.json'
-                            with open(analysis_path, 'w') as f:
-                                json.dump(analysis, f, cls=detailed_activity.NumpyEncoder)
+                jobs = [(str(activity_id), name) for activity_id, name in zip(ids.tolist(), names)]
+                
+                # Activities analyzed on an earlier run are skipped unless forced (one directory listing, no stat per job);
+                # the analysis JSON is written after the visualizations, so it marks a fully processed activity
+                if not force:
+                    analyzed = set(os.listdir('data/detailed'))
+                    pending = [job for job in jobs if os.path.basename(detailed_analyzer.analysis_path(job[0])) not in analyzed]
+                    if len(pending) < len(jobs):
+                        click.echo(f"Skipping {len(jobs) - len(pending)} already analyzed activities (use --force to redo them)")
+                    jobs = pending
+                
+                if workers > 1 and len(jobs) > 1:
+                    # Activities are independent, so fetch/analyze/plot them in separate processes
+                    with ProcessPoolExecutor(
+                        max_workers=min(workers, len(jobs)),
+                        initializer=_init_worker,
+                        initargs=(detailed_analyzer.strava.access_token,),
+                    ) as executor:
+                        futures = {
+                            executor.submit(_process_one, activity_id, name): (activity_id, name)
+                            for activity_id, name in jobs
+                        }
+                        for idx, future in enumerate(as_completed(futures), 1):
+                            activity_id, name = futures[future]
+                            try:
+                                analysis_path = future.result()
+                            except Exception as e:
+                                click.echo(f"Error processing activity {activity_id}: {e}")
+                                continue
+                            click.echo(f"Processed activity {idx}/{len(jobs)}: {activity_id} - {name}")
+                            if analysis_path:
+                                click.echo(f"Analysis saved to {analysis_path}")
+                else:
+                    for idx, (activity_id, name) in enumerate(jobs, 1):
+                        click.echo(f"Processing activity {idx}/{len(jobs)}: {activity_id} - {name}")
+                        analysis_path = detailed_analyzer.process_activity(activity_id, name)
+                        if analysis_path:
                             click.echo(f"Analysis saved to {analysis_path}")
-                        
-                        # Generate visualizations
-                        detailed_analyzer.generate_activity_visualizations(activity_id, row['name'], streams_df)
                 
                 click.echo("Detailed analysis for all activities completed.")
             else:
                 # Just list activities
+                types = activities_df['type'].to_numpy(object)
+                dates = activities_df['start_date_local'].to_numpy(object)
                 click.echo("\nAvailable activities:")
-                for idx, row in activities_df.iterrows():
-                    click.echo(f"{idx+1}. {row['name']} ({row['type']}) - {row['start_date_local']} - ID: {int(row['id'])}")
+                click.echo("\n".join(
+                    f"{idx}. {name} ({activity_type}) - {date} - ID: {activity_id}"
+                    for idx, (activity_id, name, activity_type, date) in enumerate(zip(ids.tolist(), names, types, dates), 1)
+                ))
                 
                 click.echo("\nTo analyze a specific activity, use: coach detailed --activity_id <ID>")
                 click.echo("To analyze all activities in range, use: coach detailed --all")
@@ -196,21 +346,59 @@ def detailed(activity_id, days, activity_type, all):
             click.echo("No activities found")
 
 
-@cli.command()
+@cli.command('create-activity')
+@click.option('--name', default='Test Ride', help='Activity name')
+@click.option('--sport_type', default='Ride', help='Sport type (e.g., Ride, Run)')
+@click.option('--start_date', default=None, help='Start date, YYYY-MM-DD (default: today)')
+@click.option('--start_time', default=None, help='Start time, HH:MM (default: now)')
+@click.option('--duration', default=60.0, help='Duration in minutes')
+@click.option('--distance', default=20.0, help='Distance in kilometers')
+@click.option('--description', default=None, help='Activity description')
+@click.option('--trainer', is_flag=True, help='Mark as a trainer activity')
+@click.option('--commute', is_flag=True, help='Mark as a commute')
+@click.option('--count', default=1, type=click.IntRange(min=1), help='Number of copies to create')
+@click.option('--interactive', is_flag=True, help='Prompt for the activity fields instead')
+def create_activity(name, sport_type, start_date, start_time, duration, distance, description,
+                    trainer, commute, count, interactive):
+    """Create manual test activities on Strava."""
+    from src import create_test_activity
+    
+    if interactive:
+        payload = create_test_activity.prompt_payload()
+    else:
+        start = create_test_activity.parse_start(start_date, start_time)
+        payload = create_test_activity.build_payload(
+            name, sport_type, start, duration, distance, description, trainer, commute
+        )
+    
+    created = create_test_activity.create_activities(get_api().access_token, payload, count=count)
+    click.echo(f"\nCreated {len(created)}/{count} activities.")
+    if created:
+        # The next fetch must query Strava to see the new activities
+        from src import strava_api
+        strava_api.clear_activities_cache()
+
+
+@cli.command('all')
 @click.option('--days', default=7, help='Number of days to analyze')
 @click.option('--activity_type', default='Ride', help='Type of activity to analyze (e.g., Ride, Run)')
-def all(days, activity_type):
+@click.option('--force', is_flag=True, help='Redraw the basic plots and reprocess activities that already have a detailed analysis')
+@click.option('--refresh', is_flag=True, help='Ignore the cached activity list and query Strava')
+def all_cmd(days, activity_type, force, refresh):
     """Run all analyses on activities (fetch, basic, detailed)."""
     click.echo(f"Running complete analysis for the past {days} days...")
     
-    # First, fetch the latest activities
-    fetch.callback(days=days, activity_type=activity_type)
+    # First, fetch the latest activities; without them the CSV on disk may be from another period
+    activities_df = fetch.callback(days=days, activity_type=activity_type, refresh=refresh)
+    if activities_df is None:
+        click.echo("Could not fetch activities; stopping.")
+        return
     
-    # Run basic analysis
-    basic.callback(days=days, activity_type=activity_type)
+    # Run basic analysis on the fetched data instead of re-reading the CSV
+    run_basic(days, activity_type, activities_df=activities_df, force=force)
     
-    # Run detailed analysis on all activities
-    detailed.callback(days=days, activity_type=activity_type, activity_id=None, all=True)
+    # Run detailed analysis on all fetched activities (already limited to the period and type)
+    run_detailed(None, days, activity_type, all=True, force=force, activities_df=activities_df)
     
     click.echo("\nComplete analysis finished! All results saved to data/ directory.")
 
@@ -1,8 +1,11 @@
 import os
 import requests
+from requests.adapters import HTTPAdapter
 import json
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from src.strava_api import HTTP_TIMEOUT
 
 def load_credentials():
     """Load Strava API credentials from .env file"""
@@ -33,7 +36,7 @@ def get_access_token(client_id, client_secret, refresh_token):
     }
     
     try:
-        response = requests.post(auth_url, data=payload)
+        response = requests.post(auth_url, data=payload, timeout=HTTP_TIMEOUT)
         response_json = response.json()
         
         if 'access_token' in response_json:
@@ -46,106 +49,102 @@ def get_access_token(client_id, client_secret, refresh_token):
         print(f"Error getting access token: {e}")
         return None
 
-def create_activity(access_token):
-    """Create a sample test activity using Strava API"""
-    if not access_token:
-        return None
-    
-    activities_url = "https://www.strava.com/api/v3/activities"
-    headers = {'Authorization': f'Bearer {access_token}'}
-    
-    # Get user input for activity
-    print("\nCreating a Sample Test Activity")
-    print("==============================")
-    print("This will create a manual activity on your Strava account.")
-    
-    # Default values
-    name = input("Activity Name (default: 'Test Ride'): ") or "Test Ride"
-    
-    # Sport type
-    print("\nSelect Sport Type:")
-    print("1. Ride")
-    print("2. Run")
-    print("3. Swim")
-    print("4. Walk")
-    print("5. Hike")
-    print("6. AlpineSki")
-    print("7. BackcountrySki")
-    print("8. Canoeing")
-    print("9. Crossfit")
-    print("10. EBikeRide")
-    sport_choice = input("Enter choice (default: 1): ") or "1"
-    
-    sport_types = {
-        "1": "Ride",
-        "2": "Run",
-        "3": "Swim",
-        "4": "Walk",
-        "5": "Hike",
-        "6": "AlpineSki",
-        "7": "BackcountrySki",
-        "8": "Canoeing",
-        "9": "Crossfit",
-        "10": "EBikeRide"
-    }
-    
-    sport_type = sport_types.get(sport_choice, "Ride")
-    
-    # Time and distance
-    start_date_input = input(f"Start Date (default: today, format YYYY-MM-DD): ")
-    if start_date_input:
+# Sport types offered by the interactive prompt, keyed by menu choice
+SPORT_TYPES = {
+    "1": "Ride",
+    "2": "Run",
+    "3": "Swim",
+    "4": "Walk",
+    "5": "Hike",
+    "6": "AlpineSki",
+    "7": "BackcountrySki",
+    "8": "Canoeing",
+    "9": "Crossfit",
+    "10": "EBikeRide"
+}
+
+ACTIVITIES_URL = "https://www.strava.com/api/v3/activities"
+
+def parse_start(date_input=None, time_input=None):
+    """Build the start datetime from optional YYYY-MM-DD and HH:MM strings"""
+    if date_input:
         try:
-            start_date = datetime.strptime(start_date_input, "%Y-%m-%d")
+            start_date = datetime.strptime(date_input, "%Y-%m-%d")
         except ValueError:
             print("Invalid date format. Using today.")
             start_date = datetime.now()
     else:
         start_date = datetime.now()
     
-    start_time_input = input(f"Start Time (default: {datetime.now().strftime('%H:%M')}, format HH:MM): ")
-    if start_time_input:
+    if time_input:
         try:
-            hour, minute = map(int, start_time_input.split(':'))
+            hour, minute = map(int, time_input.split(':'))
             start_date = start_date.replace(hour=hour, minute=minute)
         except (ValueError, IndexError):
             print("Invalid time format. Using current time.")
     
-    start_date_local = start_date.strftime("%Y-%m-%dT%H:%M:%SZ")
-    
-    elapsed_time_input = input("Duration in minutes (default: 60): ") or "60"
-    elapsed_time = int(float(elapsed_time_input) * 60)  # Convert to seconds
-    
-    distance_input = input("Distance in kilometers (default: 20): ") or "20"
-    distance = float(distance_input) * 1000  # Convert to meters
-    
-    description = input("Description (optional): ")
-    
-    # Create the payload
+    return start_date
+
+def build_payload(name="Test Ride", sport_type="Ride", start_date=None, duration=60, distance=20,
+                  description=None, trainer=False, commute=False):
+    """Build the Strava payload for a manual activity (duration in minutes, distance in km)"""
+    start_date = start_date or datetime.now()
     payload = {
         'name': name,
         'type': sport_type,
         'sport_type': sport_type,
-        'start_date_local': start_date_local,
-        'elapsed_time': elapsed_time,
-        'distance': distance
+        'start_date_local': start_date.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        'elapsed_time': int(float(duration) * 60),  # Convert to seconds
+        'distance': float(distance) * 1000  # Convert to meters
     }
     
     if description:
         payload['description'] = description
-    
-    # Ask if it's a trainer activity
-    trainer_input = input("Is this a trainer activity? (y/n, default: n): ").lower()
-    if trainer_input == 'y':
+    if trainer:
         payload['trainer'] = 1
-    
-    # Ask if it's a commute
-    commute_input = input("Is this a commute? (y/n, default: n): ").lower()
-    if commute_input == 'y':
+    if commute:
         payload['commute'] = 1
     
+    return payload
+
+def prompt_payload():
+    """Ask for the activity fields on stdin and build its payload"""
+    print("\nCreating a Sample Test Activity")
+    print("==============================")
+    print("This will create a manual activity on your Strava account.")
+    
+    # Default values
+    name = input("Activity Name (default: 'Test Ride'): ") or "Test Ride"
+    
+    # Sport type
+    print("\nSelect Sport Type:")
+    for choice, sport_type in SPORT_TYPES.items():
+        print(f"{choice}. {sport_type}")
+    sport_choice = input("Enter choice (default: 1): ") or "1"
+    sport_type = SPORT_TYPES.get(sport_choice, "Ride")
+    
+    # Time and distance
+    start_date_input = input(f"Start Date (default: today, format YYYY-MM-DD): ")
+    start_time_input = input(f"Start Time (default: {datetime.now().strftime('%H:%M')}, format HH:MM): ")
+    start_date = parse_start(start_date_input, start_time_input)
+    
+    duration = input("Duration in minutes (default: 60): ") or "60"
+    distance = input("Distance in kilometers (default: 20): ") or "20"
+    description = input("Description (optional): ")
+    
+    # Ask if it's a trainer activity or a commute
+    trainer = input("Is this a trainer activity? (y/n, default: n): ").lower() == 'y'
+    commute = input("Is this a commute? (y/n, default: n): ").lower() == 'y'
+    
+    return build_payload(name, sport_type, start_date, duration, distance, description, trainer, commute)
+
+def post_activity(access_token, payload, session=None):
+    """Create one manual activity on Strava and print a summary"""
+    headers = {'Authorization': f'Bearer {access_token}'}
+    
     # Make the request
     try:
-        response = requests.post(activities_url, headers=headers, json=payload)
+        response = (session or requests).post(ACTIVITIES_URL, headers=headers, json=payload, timeout=HTTP_TIMEOUT)
         
         if response.status_code == 201:
             activity = response.json()
@@ -162,4 +161,33 @@ def create_activity(access_token):
             return None
     except Exception as e:
         print(f"Error creating activity: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def create_activities(access_token, payload, count=1, max_workers=4):
+    """Create count copies of an activity concurrently over one pooled session"""
+    if not access_token:
+        return []
+    
+    if count == 1:
+        payloads = [payload]
+    else:
+        # Number the copies so they can be told apart on Strava (none at all for count <= 0)
+        payloads = [dict(payload, name=f"{payload['name']} #{i}") for i in range(1, count + 1)]
+    if not payloads:
+        return []
+    
+    # One connection per worker, reused across requests instead of a new TLS handshake per post
+    with requests.Session() as session:
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        session.mount('https://', adapter)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(lambda p: post_activity(access_token, p, session), payloads))
+    
+    return [activity for activity in results if activity]
+
+def create_activity(access_token):
+    """Create a sample test activity using Strava API"""
+    if not access_token:
+        return None
+    
+    return post_activity(access_token, prompt_payload())
@@ -1,11 +1,11 @@
 import os
+import functools
 import pandas as pd
 import numpy as np
-import requests
 from src.strava_api import StravaAPI
+from src.analyzer import load_activities
 import json
 from datetime import datetime
-import argparse
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
@@ -14,6 +14,16 @@ import yaml
 # Set default theme for all plots
 px.defaults.template = "plotly_dark"
 
+# Per-activity HTML pages load plotly.js from the CDN instead of each embedding the ~3.5 MB bundle
+HTML_OPTIONS = dict(include_plotlyjs='cdn', include_mathjax=False, full_html=True, auto_open=False)
+
+# Compact dtypes for stream columns (latitude/longitude stay float64 for positional precision)
+STREAM_FLOAT32_COLUMNS = ('watts', 'altitude', 'velocity_smooth', 'grade_smooth')
+STREAM_UNSIGNED_COLUMNS = ('heartrate', 'cadence')
+
+# Root of the per-activity figure folders
+DETAILED_FIG_DIR = os.path.join('data', 'figures', 'detailed')
+
 # Add a custom JSON encoder class to handle numpy types
 class NumpyEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -25,10 +35,113 @@ class NumpyEncoder(json.JSONEncoder):
             return obj.tolist()
         return super(NumpyEncoder, self).default(obj)
 
+class _SafeNameTable(dict):
+    """str.translate table keeping letters, digits, '_' and '-' and mapping anything else to '_'"""
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        # Each character is classified once, then translate looks it up in C
+        self[codepoint] = char if char.isalnum() or char in '_-' else '_'
+        return self[codepoint]
+
+_SAFE_NAME_TABLE = _SafeNameTable()
+
+def _safe_name(name):
+    """Filesystem-friendly version of an activity name"""
+    return name.translate(_SAFE_NAME_TABLE)
+
+def _write_atomic(path, text):
+    """Write text to a file through a temporary file, so readers never see a partial write"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+@functools.lru_cache(maxsize=None)
+def _ensure_dir(path):
+    """Create a directory once per process and return its path"""
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _has_data(df, col):
+    """Whether a stream column exists and has any non-missing value"""
+    # Use the availability recorded while the streams were parsed, scanning the column only as a fallback
+    available = df.attrs.get('available', {})
+    if col in available:
+        return available[col]
+    return col in df.columns and not df[col].isna().all()
+
+def _prefix_sum(values):
+    """Cumulative sum with a leading zero, so window sums are cs[w:] - cs[:-w]"""
+    return np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+
+def _zone_counts(values, edges):
+    """Count samples per zone, zone i covering edges[i] <= value < edges[i+1]"""
+    # One sorted lookup assigns every sample its zone; out-of-range and NaN samples are dropped
+    idx = np.searchsorted(edges, values, side='right') - 1
+    idx = idx[(idx >= 0) & (idx < len(edges) - 1)]
+    return np.bincount(idx, minlength=len(edges) - 1)
+
+def _user_zone_counts(values, zones):
+    """Count samples per user zone, each zone covering min <= value <= max (zones must not overlap)"""
+    mins = np.array([z['min'] for z in zones], dtype=np.float64)
+    maxs = np.array([z['max'] for z in zones], dtype=np.float64)
+    order = np.argsort(mins, kind='stable')
+    
+    # Candidate zone is the one with the largest min <= value; keep the sample if it is also <= that zone's max
+    idx = np.searchsorted(mins[order], values, side='right') - 1
+    valid = idx >= 0
+    idx, values = idx[valid], values[valid]
+    idx = idx[values <= maxs[order][idx]]
+    
+    counts = np.zeros(len(zones), dtype=np.int64)
+    counts[order] = np.bincount(idx, minlength=len(zones))
+    return counts
+
+def _elevation_change(altitude):
+    """Total climbing and descent (both positive) of an altitude series, ignoring gaps"""
+    steps = np.diff(altitude.to_numpy(dtype=np.float64, na_value=np.nan))
+    return float(np.nansum(np.maximum(steps, 0))), float(-np.nansum(np.minimum(steps, 0)))
+
+def _simplify_route(lat, lon, epsilon_m=5.0):
+    """Indices of the route points kept by Ramer-Douglas-Peucker simplification (tolerance in meters)"""
+    n = len(lat)
+    if n < 3:
+        return np.arange(n)
+    
+    # Local planar coordinates in meters (equirectangular is accurate enough at ride scale)
+    y = np.radians(lat) * 6371000.0
+    x = np.radians(lon) * 6371000.0 * np.cos(np.radians(np.nanmean(lat)))
+    
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    segments = [(0, n - 1)]
+    while segments:
+        start, end = segments.pop()
+        if end - start < 2:
+            continue
+        
+        # Perpendicular distance of every inner point to the segment's chord
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px_, py_ = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        chord = np.hypot(dx, dy)
+        dist = np.abs(dx * py_ - dy * px_) / chord if chord > 0 else np.hypot(px_, py_)
+        
+        farthest = int(np.argmax(dist))
+        if dist[farthest] > epsilon_m:
+            mid = start + 1 + farthest
+            keep[mid] = True
+            segments.append((start, mid))
+            segments.append((mid, end))
+    
+    return np.flatnonzero(keep)
+
 class DetailedActivityAnalyzer:
-    def __init__(self):
+    def __init__(self, access_token=None):
         """Initialize the analyzer with Strava API"""
-        self.strava = StravaAPI()
+        self.strava = StravaAPI(access_token=access_token)
+        # Detailed activity payloads already fetched or loaded, by activity id
+        self._detailed_cache = {}
+        
         # Load user zones from YAML
         self.hr_zones = []
         try:
@@ -39,35 +152,24 @@ class DetailedActivityAnalyzer:
             print(f"Warning: Could not load HR zones from zones.yaml: {e}")
         
         # Create data directories if they don't exist
-        os.makedirs('data/detailed', exist_ok=True)
-        os.makedirs('data/streams', exist_ok=True)
-        os.makedirs('data/figures/detailed', exist_ok=True)
+        _ensure_dir('data/detailed')
+        _ensure_dir('data/streams')
+        _ensure_dir(DETAILED_FIG_DIR)
     
     def get_activities(self, days=7, activity_type=None):
         """Get activities summary dataframe"""
         # First, check if we have cached activities
         csv_path = 'data/activities.csv'
         if os.path.exists(csv_path):
-            df = pd.read_csv(csv_path)
-            if 'start_date_local' in df.columns:
-                df['start_date_local'] = pd.to_datetime(df['start_date_local'])
+            # Shared loader: typed columns, served from the binary cache when the CSV is unchanged
+            df = load_activities(csv_path)
             
             # Filter by date if specified
             if days:
-                cutoff_date = pd.Timestamp.now() - pd.Timedelta(days=days)
-                
-                # Handle timezone-aware datetime comparison
+                # Dates are parsed as UTC by the loader, so the cutoff is always tz-aware
+                cutoff_date = (pd.Timestamp.now() - pd.Timedelta(days=days)).tz_localize('UTC')
                 if 'start_date_local' in df.columns:
-                    # Convert to pandas Timestamp for consistent handling
-                    cutoff_date_ts = cutoff_date
-                    
-                    # Check if start_date_local column has timezone info
-                    if hasattr(df['start_date_local'].dtype, 'tz') and df['start_date_local'].dtype.tz is not None:
-                        # Convert cutoff_date to timezone-aware
-                        cutoff_date_ts = cutoff_date_ts.tz_localize('UTC')
-                    
-                    # Filter data
-                    df = df[df['start_date_local'] >= cutoff_date_ts]
+                    df = df[df['start_date_local'] >= cutoff_date]
             
             # Filter by activity type if specified
             if activity_type:
@@ -89,38 +191,65 @@ class DetailedActivityAnalyzer:
     
     def get_detailed_activity(self, activity_id):
         """Get detailed information for a specific activity"""
+        # Already fetched or loaded by this analyzer (e.g. by process_activity_data)
+        activity_id = str(activity_id)
+        if activity_id in self._detailed_cache:
+            return self._detailed_cache[activity_id]
+        
+        # Then check the copy saved on a previous run
+        detailed_path = f'data/detailed/{activity_id}.json'
+        try:
+            with open(detailed_path, 'r') as f:
+                activity_data = json.load(f)
+            self._detailed_cache[activity_id] = activity_data
+            return activity_data
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            # Corrupt copy (e.g. from an older interrupted write); fetch it again
+            print(f"Warning: Ignoring unreadable cache {detailed_path}")
+        
         activity_url = f"https://www.strava.com/api/v3/activities/{activity_id}"
-        headers = {'Authorization': f'Bearer {self.strava.access_token}'}
         params = {'include_all_efforts': True}
         
         try:
-            response = requests.get(activity_url, headers=headers, params=params)
+            response = self.strava.get(activity_url, params=params)
             
             if response.status_code != 200:
                 print(f"Error: {response.status_code}")
                 print(response.text)
                 return None
             
-            return response.json()
+            activity_data = response.json()
         except Exception as e:
             print(f"Error getting detailed activity: {e}")
             return None
+        
+        # Save detailed activity data
+        _write_atomic(detailed_path, json.dumps(activity_data))
+        self._detailed_cache[activity_id] = activity_data
+        
+        return activity_data
     
     def get_activity_streams(self, activity_id):
         """Get detailed data streams for a specific activity"""
         # First check if we have cached streams
         stream_path = f'data/streams/{activity_id}.json'
-        if os.path.exists(stream_path):
+        try:
             with open(stream_path, 'r') as f:
                 return json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            print(f"Warning: Ignoring unreadable cache {stream_path}")
         
         # If not cached, fetch from API
         streams = self.strava.get_activity_streams(activity_id)
         
         # Cache the streams for future use
         if streams:
-            with open(stream_path, 'w') as f:
-                json.dump(streams, f)
+            # Encode in one pass with the C encoder, as in save_analysis
+            _write_atomic(stream_path, json.dumps(streams))
         
         return streams
     
@@ -129,18 +258,13 @@ class DetailedActivityAnalyzer:
         # Get detailed activity data
         activity_data = self.get_detailed_activity(activity_id)
         if not activity_data:
-            return None
+            return None, None
         
         # Get activity streams
         streams = self.get_activity_streams(activity_id)
         if not streams:
             print(f"No streams found for activity {activity_id}")
-            return activity_data
-        
-        # Save detailed activity data
-        detailed_path = f'data/detailed/{activity_id}.json'
-        with open(detailed_path, 'w') as f:
-            json.dump(activity_data, f)
+            return activity_data, None
         
         # Process the streams into a DataFrame
         stream_data = {}
@@ -154,16 +278,32 @@ class DetailedActivityAnalyzer:
         df = None
         if 'time' in stream_data:
             df = pd.DataFrame({'time': stream_data['time']})
+            # Which streams hold any value, noted while ingesting (stops at the first non-null sample)
+            available = {}
             
             # Add all other streams
             for stream_type, data in stream_data.items():
                 if stream_type != 'time':
+                    has_values = any(value is not None for value in data)
                     if stream_type == 'latlng' and len(data) > 0 and isinstance(data[0], list) and len(data[0]) == 2:
                         # Special handling for latlng which is a list of [lat, lng] pairs
-                        df['latitude'] = [coord[0] for coord in data]
-                        df['longitude'] = [coord[1] for coord in data]
+                        latlng = np.asarray(data, dtype=np.float64)
+                        df['latitude'] = latlng[:, 0]
+                        df['longitude'] = latlng[:, 1]
+                        available['latitude'] = available['longitude'] = has_values
                     else:
                         df[stream_type] = data
+                        available[stream_type] = has_values
+            df.attrs['available'] = available
+            
+            # Downcast the numeric streams so analysis and plotting move less memory
+            df['time'] = df['time'].astype(np.int32)
+            for col in STREAM_UNSIGNED_COLUMNS:
+                if col in df.columns:
+                    df[col] = pd.to_numeric(df[col], downcast='unsigned')
+            for col in STREAM_FLOAT32_COLUMNS:
+                if col in df.columns:
+                    df[col] = df[col].astype(np.float32)
         
         # Add activity name and ID for reference
         if df is not None:
@@ -182,7 +322,8 @@ class DetailedActivityAnalyzer:
         if df is None:
             return None
         
-        # Basic analysis
+        # Basic analysis (values are stored as native Python numbers so the JSON
+        # encoder never has to fall back to NumpyEncoder.default)
         analysis = {}
         
         # Time in heart rate zones
@@ -190,43 +331,38 @@ class DetailedActivityAnalyzer:
             # Define heart rate zones (approximate, should be customized per athlete)
             max_hr = activity_data.get('max_heartrate', df['heartrate'].max())
             
-            # Calculate heart rate zones based on max HR
-            zones = {
-                'Z1': (0, int(max_hr * 0.6)),
-                'Z2': (int(max_hr * 0.6), int(max_hr * 0.7)),
-                'Z3': (int(max_hr * 0.7), int(max_hr * 0.8)),
-                'Z4': (int(max_hr * 0.8), int(max_hr * 0.9)),
-                'Z5': (int(max_hr * 0.9), int(max_hr * 1.1))
-            }
+            # Calculate heart rate zones based on max HR (Z1 starts at 0, Z5 ends at 110%)
+            zone_names = ['Z1', 'Z2', 'Z3', 'Z4', 'Z5']
+            edges = np.array([0] + [int(max_hr * f) for f in (0.6, 0.7, 0.8, 0.9, 1.1)], dtype=np.float64)
+            counts = _zone_counts(df['heartrate'].to_numpy(dtype=np.float64, na_value=np.nan), edges)
             
-            # Calculate time spent in each zone
+            # Calculate time spent in each zone: samples in the zone times the typical sample interval
             hr_zones = {}
-            for zone, (lower, upper) in zones.items():
-                zone_data = df[(df['heartrate'] >= lower) & (df['heartrate'] < upper)]
-                if len(zone_data) > 0 and 'time' in zone_data.columns:
-                    # Calculate time spent in seconds
-                    if len(zone_data) > 1:
-                        time_in_zone = zone_data['time'].iloc[-1] - zone_data['time'].iloc[0]
-                    else:
-                        time_in_zone = 0
-                    
-                    hr_zones[zone] = {
-                        'time_seconds': time_in_zone,
-                        'percentage': time_in_zone / df['time'].iloc[-1] * 100 if df['time'].iloc[-1] > 0 else 0
-                    }
+            if 'time' in df.columns:
+                times = df['time'].to_numpy()
+                sample_interval = float(np.median(np.diff(times))) if len(times) > 1 else 0.0
+                total_time = times[-1]
+                
+                for zone, count in zip(zone_names, counts.tolist()):
+                    if count > 0:
+                        time_in_zone = count * sample_interval
+                        hr_zones[zone] = {
+                            'time_seconds': int(time_in_zone),
+                            'percentage': float(time_in_zone / total_time * 100) if total_time > 0 else 0
+                        }
             
             analysis['heart_rate_zones'] = hr_zones
         
         # Power analysis (if available)
-        if 'watts' in df.columns and not df['watts'].isna().all():
+        if _has_data(df, 'watts'):
             # Clean and filter power data
             power_data = df[df['watts'] > 0]['watts']
             
             if len(power_data) > 0:
                 # Calculate power metrics
                 analysis['power'] = {
-                    'average': power_data.mean(),
-                    'max': power_data.max(),
+                    'average': float(power_data.mean()),
+                    'max': float(power_data.max()),
                     'normalized_power': self.calculate_normalized_power(power_data),
                 }
                 
@@ -234,30 +370,28 @@ class DetailedActivityAnalyzer:
                 analysis['power_curve'] = self.calculate_power_curve(power_data)
         
         # Cadence analysis
-        if 'cadence' in df.columns and not df['cadence'].isna().all():
+        if _has_data(df, 'cadence'):
             cadence_data = df[df['cadence'] > 0]['cadence']
             
             if len(cadence_data) > 0:
                 analysis['cadence'] = {
-                    'average': cadence_data.mean(),
-                    'max': cadence_data.max(),
+                    'average': float(cadence_data.mean()),
+                    'max': float(cadence_data.max()),
                     'distribution': self.calculate_distribution(cadence_data, bin_size=5)
                 }
         
         # Elevation analysis
         if 'altitude' in df.columns:
             altitude_data = df['altitude']
-            if not altitude_data.isna().all():
+            if _has_data(df, 'altitude'):
                 # Calculate elevation gain/loss
-                altitude_diff = altitude_data.diff().fillna(0)
-                elevation_gain = altitude_diff[altitude_diff > 0].sum()
-                elevation_loss = abs(altitude_diff[altitude_diff < 0].sum())
+                elevation_gain, elevation_loss = _elevation_change(altitude_data)
                 
                 analysis['elevation'] = {
                     'gain': elevation_gain,
                     'loss': elevation_loss,
-                    'max': altitude_data.max(),
-                    'min': altitude_data.min()
+                    'max': float(altitude_data.max()),
+                    'min': float(altitude_data.min())
                 }
                 
                 # Calculate gradient distribution if grade_smooth available
@@ -269,15 +403,27 @@ class DetailedActivityAnalyzer:
         if 'velocity_smooth' in df.columns:
             speed_data = df['velocity_smooth']
             
-            if not speed_data.isna().all():
+            if _has_data(df, 'velocity_smooth'):
                 analysis['speed'] = {
-                    'average': speed_data.mean(),
-                    'max': speed_data.max(),
+                    'average': float(speed_data.mean()),
+                    'max': float(speed_data.max()),
                     'distribution': self.calculate_distribution(speed_data, bin_size=1)
                 }
         
         return analysis
     
+    def analysis_path(self, activity_id):
+        """Path of the saved analysis JSON for an activity"""
+        return f'data/detailed/{activity_id}_analysis.json'
+    
+    def save_analysis(self, activity_id, analysis):
+        """Save an activity analysis as JSON and return its path"""
+        analysis_path = self.analysis_path(activity_id)
+        # json.dumps encodes in one pass with the C encoder; json.dump streams through the pure-Python one
+        # Written atomically, so an interrupted write never leaves a truncated analysis file
+        _write_atomic(analysis_path, json.dumps(analysis, cls=NumpyEncoder))
+        return analysis_path
+    
     def calculate_normalized_power(self, power_series):
         """Calculate normalized power from power data"""
         if len(power_series) < 30:
@@ -286,17 +432,15 @@ class DetailedActivityAnalyzer:
         # Convert to numpy array for faster computation
         power_array = power_series.to_numpy()
         
-        # Calculate 30-second moving average
+        # Calculate 30-second moving average from the prefix sum
         window_size = 30  # assuming data points are 1 second apart
-        weights = np.ones(window_size) / window_size
-        power_30s = np.convolve(power_array, weights, 'valid')
+        cumsum = _prefix_sum(power_array)
+        power_30s = (cumsum[window_size:] - cumsum[:-window_size]) / window_size
         
-        # Raise to 4th power
-        power_30s_4 = np.power(power_30s, 4)
-        
-        # Average and take 4th root
-        if len(power_30s_4) > 0:
-            return np.power(np.mean(power_30s_4), 0.25)
+        # Mean of the 4th powers as a dot product of the squares (no 4th-power temporary), then 4th root
+        if len(power_30s) > 0:
+            np.square(power_30s, out=power_30s)
+            return float((np.dot(power_30s, power_30s) / len(power_30s)) ** 0.25)
         else:
             return None
     
@@ -309,19 +453,20 @@ class DetailedActivityAnalyzer:
         durations = [5, 10, 30, 60, 300, 600, 1200, 1800, 3600]
         power_curve = {}
         
-        # Convert to numpy array
+        # One prefix sum serves every duration (instead of a convolution per duration)
         power_array = power_series.to_numpy()
+        cumsum = _prefix_sum(power_array)
         
+        # Window sums for each duration are written into one reused buffer instead of a new array each
+        window_sums = np.empty(len(power_array), dtype=np.float64)
         for duration in durations:
             if len(power_array) < duration:
                 continue
                 
-            # Calculate moving average for the duration
-            weights = np.ones(duration) / duration
-            moving_avg = np.convolve(power_array, weights, 'valid')
-            
-            if len(moving_avg) > 0:
-                power_curve[f"{duration}s"] = float(np.max(moving_avg))
+            # Best rolling sum for the duration, divided once
+            sums = window_sums[:len(cumsum) - duration]
+            np.subtract(cumsum[duration:], cumsum[:-duration], out=sums)
+            power_curve[f"{duration}s"] = float(sums.max()) / duration
         
         return power_curve
     
@@ -333,23 +478,20 @@ class DetailedActivityAnalyzer:
         # Define bins
         min_val = int(series.min())
         max_val = int(series.max()) + 1
-        bins = range(min_val, max_val, bin_size)
+        bins = np.arange(min_val, max_val, bin_size, dtype=np.float64)
         
         # Count values in each bin
-        hist, edges = np.histogram(series, bins=bins)
+        hist, edges = np.histogram(series.to_numpy(), bins=bins)
         
-        # Convert to dictionary
-        distribution = {}
-        for i in range(len(hist)):
-            bin_range = f"{edges[i]:.1f}-{edges[i+1]:.1f}"
-            distribution[bin_range] = int(hist[i])
-        
-        return distribution
+        # Convert to dictionary, formatting all "lo-hi" labels in one go
+        edge_labels = np.char.mod('%.1f', edges)
+        labels = np.char.add(np.char.add(edge_labels[:-1], '-'), edge_labels[1:])
+        return dict(zip(labels.tolist(), hist.tolist()))
     
-    def generate_activity_visualizations(self, activity_id, activity_name, df):
-        """Generate all visualizations for a single activity"""
+    def generate_activity_visualizations(self, activity_id, activity_name, df, analysis=None):
+        """Generate all visualizations for a single activity, reusing its analysis if given"""
         # Create filesystem-friendly activity name
-        safe_name = activity_name.replace(' ', '_')
+        safe_name = _safe_name(activity_name)
         
         # Get activity data to get start time
         activity_data = self.get_detailed_activity(activity_id)
@@ -362,26 +504,52 @@ class DetailedActivityAnalyzer:
         
         # Create subfolder for this activity using activity name and datetime
         folder_name = f'{safe_name}_{datetime_str}'
-        os.makedirs(f'data/figures/detailed/{folder_name}', exist_ok=True)
+        folder_path = _ensure_dir(os.path.join(DETAILED_FIG_DIR, folder_name))
         
         # Create dashboard
-        self.create_activity_dashboard(df, activity_id, activity_name, folder_name)
+        if analysis is None and activity_data:
+            analysis = self.analyze_streams(df, activity_data)
+        self.create_activity_dashboard(df, activity_id, activity_name, folder_name, analysis)
         
         # Create enhanced map
         self.create_enhanced_map(df, activity_id, 'altitude', 'Altitude (m)', 'earth', folder_name=folder_name)
         
-        print(f"Visualizations for activity '{activity_name}' saved to data/figures/detailed/{folder_name}/")
+        print(f"Visualizations for activity '{activity_name}' saved to {folder_path}{os.sep}")
     
-    def create_activity_dashboard(self, df, activity_id, activity_name, folder_name):
+    def process_activity(self, activity_id, activity_name=None):
+        """Fetch, analyze and visualize one activity; returns the analysis path if one was saved"""
+        activity_data, streams_df = self.process_activity_data(activity_id)
+        if not activity_data or streams_df is None:
+            return None
+        
+        analysis_path = None
+        analysis = self.analyze_streams(streams_df, activity_data)
+        
+        # Generate visualizations
+        self.generate_activity_visualizations(activity_id, activity_name or activity_data.get('name', 'Activity'), streams_df, analysis)
+        
+        # Save analysis to JSON last: `detailed --all` skips activities that have one, so it must
+        # only exist once the visualizations were generated too
+        if analysis:
+            analysis_path = self.save_analysis(activity_id, analysis)
+        return analysis_path
+    
+    def create_activity_dashboard(self, df, activity_id, activity_name, folder_name, analysis=None):
         """Create a consolidated dashboard with all visualizations for an activity"""
+        analysis = analysis or {}
+
         # Determine what data is available
-        has_hr = 'heartrate' in df.columns and not df['heartrate'].isna().all()
-        has_power = 'watts' in df.columns and not df['watts'].isna().all()
-        has_speed = 'velocity_smooth' in df.columns and not df['velocity_smooth'].isna().all()
-        has_cadence = 'cadence' in df.columns and not df['cadence'].isna().all()
-        has_altitude = 'altitude' in df.columns and not df['altitude'].isna().all()
+        has_hr = _has_data(df, 'heartrate')
+        has_power = _has_data(df, 'watts')
+        has_speed = _has_data(df, 'velocity_smooth')
+        has_cadence = _has_data(df, 'cadence')
+        has_altitude = _has_data(df, 'altitude')
         has_map = 'latitude' in df.columns and 'longitude' in df.columns
 
+        # Unit conversions shared by several traces, computed once
+        time_min = df['time'].to_numpy() / 60  # minutes
+        speed_kmh = df['velocity_smooth'].to_numpy() * 3.6 if has_speed else None  # km/h
+
         # Create a figure with appropriate number of subplots (restore 3x2 grid for table and pie chart)
         fig = make_subplots(
             rows=3, 
@@ -418,7 +586,7 @@ class DetailedActivityAnalyzer:
                 # Raw HR line
                 fig.add_trace(
                     go.Scatter(
-                        x=df['time']/60, 
+                        x=time_min, 
                         y=df['heartrate'],
                         name="Heart Rate",
                         line=dict(color="#e74c3c", width=1.5),
@@ -429,7 +597,7 @@ class DetailedActivityAnalyzer:
                 # 30s moving average HR line
                 fig.add_trace(
                     go.Scatter(
-                        x=df['time']/60,
+                        x=time_min,
                         y=hr_rolling,
                         name="HR (30s avg)",
                         line=dict(color="#00d8ff", width=1.5)
@@ -439,7 +607,7 @@ class DetailedActivityAnalyzer:
             if has_power:
                 fig.add_trace(
                     go.Scatter(
-                        x=df['time']/60, 
+                        x=time_min, 
                         y=df['watts'],
                         name="Power",
                         line=dict(color="#2ecc71", width=2),
@@ -478,8 +646,8 @@ class DetailedActivityAnalyzer:
             if has_speed:
                 fig.add_trace(
                     go.Scatter(
-                        x=df['time']/60, 
-                        y=df['velocity_smooth']*3.6,  # Convert to km/h
+                        x=time_min, 
+                        y=speed_kmh,
                         name="Speed",
                         line=dict(color="#3498db", width=2)
                     ),
@@ -488,7 +656,7 @@ class DetailedActivityAnalyzer:
             if has_cadence:
                 fig.add_trace(
                     go.Scatter(
-                        x=df['time']/60, 
+                        x=time_min, 
                         y=df['cadence'],
                         name="Cadence",
                         line=dict(color="#9b59b6", width=2),
@@ -515,7 +683,7 @@ class DetailedActivityAnalyzer:
                 x_data = df['distance']/1000  # Convert to km
                 x_label = "Distance (km)"
             else:
-                x_data = df['time']/60  # Convert to minutes
+                x_data = time_min
                 x_label = "Time (minutes)"
             fig.add_trace(
                 go.Scatter(
@@ -532,10 +700,14 @@ class DetailedActivityAnalyzer:
 
         # 4. Route Map
         if has_map:
+            # Drop points that lie within 5 m of the simplified line; invisible at this zoom
+            lat = df['latitude'].to_numpy()
+            lon = df['longitude'].to_numpy()
+            kept = _simplify_route(lat, lon)
             fig.add_trace(
                 go.Scattermapbox(
-                    lat=df['latitude'],
-                    lon=df['longitude'],
+                    lat=lat[kept],
+                    lon=lon[kept],
                     mode='lines',
                     line=dict(width=4, color='#e74c3c'),
                     name="Route"
@@ -560,7 +732,11 @@ class DetailedActivityAnalyzer:
             values.extend([df['heartrate'].mean(), df['heartrate'].max()])
         if has_power:
             metrics.extend(["Avg Power", "Max Power", "NP (est)"])
-            np_est = self.calculate_normalized_power(df['watts'])
+            # Metrics already computed by analyze_streams are reused rather than recomputed
+            if 'power' in analysis:
+                np_est = analysis['power']['normalized_power']
+            else:
+                np_est = self.calculate_normalized_power(df['watts'])
             values.extend([df['watts'].mean(), df['watts'].max(), np_est if np_est else 0])
         if has_speed:
             metrics.extend(["Avg Speed", "Max Speed"])
@@ -569,8 +745,10 @@ class DetailedActivityAnalyzer:
             metrics.extend(["Avg Cadence"])
             values.extend([df[df['cadence'] > 0]['cadence'].mean()])
         if has_altitude:
-            altitude_diff = df['altitude'].diff().fillna(0)
-            elevation_gain = altitude_diff[altitude_diff > 0].sum()
+            if 'elevation' in analysis:
+                elevation_gain = analysis['elevation']['gain']
+            else:
+                elevation_gain, _ = _elevation_change(df['altitude'])
             metrics.extend(["Elevation Gain"])
             values.extend([elevation_gain])
         fig.add_trace(
@@ -594,10 +772,7 @@ class DetailedActivityAnalyzer:
         # 5. HR Zone Pie Chart (user-specified zones)
         if has_hr and self.hr_zones:
             zone_labels = [z['name'] for z in self.hr_zones]
-            zone_counts = []
-            for z in self.hr_zones:
-                mask = (df['heartrate'] >= z['min']) & (df['heartrate'] <= z['max'])
-                zone_counts.append(mask.sum())
+            zone_counts = _user_zone_counts(df['heartrate'].to_numpy(dtype=np.float64, na_value=np.nan), self.hr_zones)
             fig.add_trace(
                 go.Pie(
                     labels=zone_labels,
@@ -625,7 +800,7 @@ class DetailedActivityAnalyzer:
         )
 
         # Save as interactive HTML
-        fig.write_html(f'data/figures/detailed/{folder_name}/dashboard.html')
+        fig.write_html(os.path.join(DETAILED_FIG_DIR, folder_name, 'dashboard.html'), **HTML_OPTIONS)
         
         # Create individual plots for specific sections (optional)
         
@@ -664,10 +839,8 @@ class DetailedActivityAnalyzer:
                     width=800
                 )
                 
-                # Save as interactive HTML
-                if folder_name:
-                    fig.write_html(f'data/figures/detailed/{folder_name}/map_{color_col}.html')
-                else:
-                    fig.write_html(f'data/figures/detailed/{activity_id}/map_{color_col}.html')
+                # Save as interactive HTML (in the activity id folder when no named folder is given)
+                map_path = os.path.join(DETAILED_FIG_DIR, folder_name or str(activity_id), f'map_{color_col}.html')
+                fig.write_html(map_path, **HTML_OPTIONS)
             except Exception as e:
                 print(f"Warning: Could not create enhanced map for {color_col}: {str(e)}")
\ No newline at end of file
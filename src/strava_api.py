@@ -1,27 +1,138 @@
 import os
+import functools
+import glob
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import time
-from datetime import datetime, timedelta
-import pandas as pd
-from dotenv import load_dotenv
+from dotenv import load_dotenv, set_key
+
+# Connect and read timeouts for every Strava request, so a stalled endpoint cannot hang a run
+HTTP_TIMEOUT = (5, 30)  # seconds
+
+# Stored access tokens are refreshed this long before Strava says they expire
+TOKEN_EXPIRY_MARGIN = 60  # seconds
+
+# Activity lists are cached on disk for a short while so back-to-back commands don't refetch them
+CACHE_DIR = os.path.join('data', '.cache')
+ACTIVITIES_CACHE_TTL = 15 * 60  # seconds
+
+# Activity summary fields kept from the Strava API, in column order
+ACTIVITY_FIELDS = (
+    'id',
+    'name',
+    'type',
+    'start_date_local',
+    'distance',  # in meters
+    'moving_time',  # in seconds
+    'elapsed_time',  # in seconds
+    'total_elevation_gain',  # in meters
+    'average_speed',  # in m/s
+    'max_speed',  # in m/s
+    'average_heartrate',
+    'max_heartrate',
+    'average_watts',
+    'weighted_average_watts',
+    'kilojoules',
+    'device_watts',
+    'max_watts',
+    'suffer_score',
+    'has_heartrate',
+    'average_cadence',
+    'average_temp',
+    'achievement_count',
+    'kudos_count',
+    'comment_count',
+    'athlete_count',
+    'calories',
+)
+
+# Declared dtypes for the metric fields, which Strava omits when there is no data (e.g. no power
+# meter); these are built typed with NaN for gaps, the remaining columns are inferred
+ACTIVITY_DTYPES = {
+    field: 'float32' for field in (
+        'distance',
+        'total_elevation_gain',
+        'average_speed',
+        'max_speed',
+        'average_heartrate',
+        'max_heartrate',
+        'average_watts',
+        'weighted_average_watts',
+        'kilojoules',
+        'max_watts',
+        'suffer_score',
+        'average_cadence',
+        'average_temp',
+        'calories',
+    )
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _load_env(env_path):
+    """Load a .env file into the environment once per process"""
+    # load_dotenv never overrides variables already set, so reloading the same file changes nothing
+    load_dotenv(env_path)
+
+
+def clear_activities_cache():
+    """Drop the cached activity lists, e.g. after creating an activity they would not show"""
+    for cache_path in glob.glob(os.path.join(CACHE_DIR, 'activities_*d.json')):
+        try:
+            os.remove(cache_path)
+        except FileNotFoundError:
+            pass
+
+
+@functools.lru_cache(maxsize=None)
+def get_session():
+    """Return the process-wide Strava HTTP session, creating it on first use"""
+    # Keep-alive connections shared by every Strava call, retrying rate limits and server errors
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    session.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=retries))
+    return session
+
+
+# A forked child (e.g. a ProcessPoolExecutor worker) must not share the parent's keep-alive sockets
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=get_session.cache_clear)
+
 
 class StravaAPI:
-    def __init__(self, config_path='config'):
+    def __init__(self, config_path='config', access_token=None):
         # Load environment variables
-        load_dotenv(os.path.join(config_path, '.env'))
+        _load_env(os.path.join(config_path, '.env'))
         
         # Strava API credentials
         self.client_id = os.getenv('STRAVA_CLIENT_ID')
         self.client_secret = os.getenv('STRAVA_CLIENT_SECRET')
         self.refresh_token = os.getenv('STRAVA_REFRESH_TOKEN')
+        # Expiry (Unix time) of the access token stored by the last refresh; tokens last 6 hours
+        self.expires_at = os.getenv('STRAVA_EXPIRES_AT')
         
         # API endpoints
         self.auth_url = "https://www.strava.com/oauth/token"
+        self.athlete_url = "https://www.strava.com/api/v3/athlete"
         self.activities_url = "https://www.strava.com/api/v3/athlete/activities"
         
-        # Get access token
-        self.access_token = self._get_access_token()
+        # Reuse a token obtained by another process (e.g. a worker's parent) or still valid from an
+        # earlier run, otherwise refresh
+        self.access_token = access_token or self._stored_access_token() or self._get_access_token()
+        # Authorization header for API requests, built once per token rather than per request
+        self.headers = {'Authorization': f'Bearer {self.access_token}'}
+    
+    def _stored_access_token(self):
+        """Return the access token saved in the .env file if it has not expired, else None"""
+        access_token = os.getenv('STRAVA_ACCESS_TOKEN')
+        try:
+            if access_token and float(self.expires_at) - TOKEN_EXPIRY_MARGIN > time.time():
+                return access_token
+        except (TypeError, ValueError):
+            pass
+        return None
     
     def _get_access_token(self):
         """Get a new access token using the refresh token"""
@@ -37,25 +148,24 @@ class StravaAPI:
         }
         
         try:
-            response = requests.post(self.auth_url, data=payload)
+            response = get_session().post(self.auth_url, data=payload, timeout=HTTP_TIMEOUT)
             response_json = response.json()
             
             if 'refresh_token' in response_json:
-                # Save the new refresh token
+                # Save the new refresh token, and the access token so later runs can skip this request
                 self.refresh_token = response_json['refresh_token']
+                self.expires_at = response_json.get('expires_at')
+                updates = {
+                    'STRAVA_REFRESH_TOKEN': self.refresh_token,
+                    'STRAVA_ACCESS_TOKEN': response_json['access_token'],
+                    'STRAVA_EXPIRES_AT': self.expires_at,
+                }
                 
-                # Update the .env file
+                # Update the .env file in place; set_key swaps in a rewritten copy and appends missing keys
                 env_path = os.path.join('config', '.env')
                 if os.path.exists(env_path):
-                    with open(env_path, 'r') as f:
-                        lines = f.readlines()
-                    
-                    with open(env_path, 'w') as f:
-                        for line in lines:
-                            if line.startswith('STRAVA_REFRESH_TOKEN='):
-                                f.write(f'STRAVA_REFRESH_TOKEN={self.refresh_token}\n')
-                            else:
-                                f.write(line)
+                    for key, value in updates.items():
+                        set_key(env_path, key, str(value), quote_mode='never')
                 
                 return response_json['access_token']
             else:
@@ -66,85 +176,120 @@ class StravaAPI:
             print(f"Error getting access token: {e}")
             return None
     
-    def get_activities(self, days=7):
+    def get(self, url, params=None):
+        """GET a Strava API endpoint, refreshing the access token and retrying once if it is rejected"""
+        response = get_session().get(url, headers=self.headers, params=params, timeout=HTTP_TIMEOUT)
+        
+        # A stored token can be revoked before it expires
+        if response.status_code == 401:
+            access_token = self._get_access_token()
+            if access_token:
+                self.access_token = access_token
+                self.headers = {'Authorization': f'Bearer {self.access_token}'}
+                response = get_session().get(url, headers=self.headers, params=params, timeout=HTTP_TIMEOUT)
+        
+        return response
+    
+    def check_access(self):
+        """Whether Strava accepts the access token, refreshing it once if needed"""
+        if not self.access_token:
+            return False
+        try:
+            return self.get(self.athlete_url).status_code == 200
+        except requests.RequestException as e:
+            print(f"Error checking access token: {e}")
+            return False
+    
+    def get_activities(self, days=7, use_cache=True):
         """Get activities from the past specified days"""
         if not self.access_token:
             print("Error: No access token available. Please run strava_auth.py first.")
             return None
+        
+        # Serve a recent response for the same period from the on-disk cache
+        cache_path = os.path.join(CACHE_DIR, f'activities_{days}d.json')
+        if use_cache:
+            try:
+                if time.time() - os.path.getmtime(cache_path) < ACTIVITIES_CACHE_TTL:
+                    with open(cache_path, 'r') as f:
+                        return json.load(f)
+            except (OSError, ValueError):
+                pass
             
         # Calculate time period
-        after_timestamp = int((datetime.now() - timedelta(days=days)).timestamp())
+        after_timestamp = int(time.time() - days * 86400)
         
-        # Set up headers and parameters
-        headers = {'Authorization': f'Bearer {self.access_token}'}
-        params = {'after': after_timestamp, 'per_page': 200}
+        # Set up parameters
+        per_page = 200  # Strava's maximum page size
         
-        # Make the request
+        # Make the requests, one page at a time until a short page marks the end
         try:
-            response = requests.get(self.activities_url, headers=headers, params=params)
+            activities = []
+            page = 1
+            while True:
+                params = {'after': after_timestamp, 'per_page': per_page, 'page': page}
+                response = self.get(self.activities_url, params=params)
+                
+                if response.status_code != 200:
+                    print(f"Error: {response.status_code}")
+                    print(response.text)
+                    return None
+                
+                batch = response.json()
+                activities.extend(batch)
+                if len(batch) < per_page:
+                    break
+                page += 1
             
-            if response.status_code != 200:
-                print(f"Error: {response.status_code}")
-                print(response.text)
-                return None
+            try:
+                # Written through a temporary file, so a concurrent run never reads a partial list
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                tmp_path = cache_path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(activities, f)
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                print(f"Warning: Could not write activities cache {cache_path}: {e}")
             
-            return response.json()
+            return activities
         except Exception as e:
             print(f"Error getting activities: {e}")
             return None
     
-    def parse_activities(self, activities):
-        """Parse activities data into a DataFrame"""
+    def parse_activities(self, activities, keep_types=None):
+        """Parse activities data into a DataFrame, optionally keeping only some activity types"""
+        # NumPy and pandas are only needed here, so token refreshes and fetches do not pay for importing them
+        import numpy as np
+        import pandas as pd
+        
+        # Drop unwanted types before building any rows
+        if activities and keep_types:
+            activities = [activity for activity in activities if activity.get('type') in keep_types]
+        
         if not activities:
             return None
         
-        # Extract relevant fields
-        parsed_activities = []
-        for activity in activities:
-            parsed_activity = {
-                'id': activity.get('id'),
-                'name': activity.get('name'),
-                'type': activity.get('type'),
-                'start_date_local': activity.get('start_date_local'),
-                'distance': activity.get('distance'),  # in meters
-                'moving_time': activity.get('moving_time'),  # in seconds
-                'elapsed_time': activity.get('elapsed_time'),  # in seconds
-                'total_elevation_gain': activity.get('total_elevation_gain'),  # in meters
-                'average_speed': activity.get('average_speed'),  # in m/s
-                'max_speed': activity.get('max_speed'),  # in m/s
-                'average_heartrate': activity.get('average_heartrate'),
-                'max_heartrate': activity.get('max_heartrate'),
-                'average_watts': activity.get('average_watts'),
-                'weighted_average_watts': activity.get('weighted_average_watts'),
-                'kilojoules': activity.get('kilojoules'),
-                'device_watts': activity.get('device_watts'),
-                'max_watts': activity.get('max_watts'),
-                'suffer_score': activity.get('suffer_score'),
-                'has_heartrate': activity.get('has_heartrate'),
-                'average_cadence': activity.get('average_cadence'),
-                'average_temp': activity.get('average_temp'),
-                'achievement_count': activity.get('achievement_count'),
-                'kudos_count': activity.get('kudos_count'),
-                'comment_count': activity.get('comment_count'),
-                'athlete_count': activity.get('athlete_count'),
-                'calories': activity.get('calories'),
-            }
-            parsed_activities.append(parsed_activity)
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(parsed_activities)
-        
-        # Convert date string to datetime
+        # Build the frame column by column from flat lists instead of a 2-D object array of rows;
+        # declared columns skip dtype inference (np.array turns missing values into NaN)
+        columns = {}
+        for field in ACTIVITY_FIELDS:
+            values = [activity.get(field) for activity in activities]
+            dtype = ACTIVITY_DTYPES.get(field)
+            columns[field] = np.array(values, dtype=dtype) if dtype else values
+        df = pd.DataFrame(columns, columns=ACTIVITY_FIELDS)
+        
+        # Convert date string to datetime (always ISO 8601 from Strava, so skip format inference)
         if 'start_date_local' in df.columns:
-            df['start_date_local'] = pd.to_datetime(df['start_date_local'])
+            df['start_date_local'] = pd.to_datetime(df['start_date_local'], format='ISO8601', utc=True)
         
         return df
     
     def save_activities(self, df, file_path='data/activities.csv'):
         """Save activities DataFrame to a CSV file"""
         if df is not None:
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            df.to_csv(file_path, index=False)
+            # Also refreshes the parsed-frame cache next to the CSV
+            from src.analyzer import save_activities
+            save_activities(df, file_path)
             print(f"Activities saved to {file_path}")
         else:
             print("No activities to save")
@@ -152,16 +297,20 @@ class StravaAPI:
     def get_activity_streams(self, activity_id):
         """Get detailed data streams for a specific activity"""
         streams_url = f"https://www.strava.com/api/v3/activities/{activity_id}/streams"
-        headers = {'Authorization': f'Bearer {self.access_token}'}
         params = {
             'keys': 'time,distance,latlng,altitude,velocity_smooth,heartrate,cadence,watts,temp,moving,grade_smooth',
             'key_by_type': True
         }
         
-        response = requests.get(streams_url, headers=headers, params=params)
+        try:
+            response = self.get(streams_url, params=params)
+        except requests.RequestException as e:
+            # Timeouts, and rate limits or server errors still failing after the adapter's retries
+            print(f"Error getting streams for activity {activity_id}: {e}")
+            return None
         
         if response.status_code != 200:
             print(f"Error: {response.status_code}")
             return None
         
-        return response.json()
\ No newline at end of file
+        return response.json()
@@ -1,16 +1,28 @@
-import requests
 import json
 import os
 import webbrowser
 from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import parse_qs, urlparse
+from urllib.parse import parse_qs, urlparse, urlencode
 import threading
 import time
 import click
 
+# Strava authorization URL; only the client id and scope vary, so the rest of the query is encoded once
+AUTHORIZE_URL = "https://www.strava.com/oauth/authorize"
+AUTHORIZE_QUERY = urlencode({
+    'redirect_uri': 'http://localhost:8000',
+    'response_type': 'code',
+})
+
+# Access requested by default; write access is only needed by `coach create-activity`
+READ_SCOPE = 'activity:read_all'
+WRITE_SCOPE = 'activity:read_all,activity:write'
+
 class AuthHandler(BaseHTTPRequestHandler):
     """Handle the OAuth callback from Strava"""
     code = None
+    # Set once the callback has been received, waking up get_auth_code
+    done = threading.Event()
     
     def do_GET(self):
         """Process the GET request with the authorization code"""
@@ -24,6 +36,7 @@ class AuthHandler(BaseHTTPRequestHandler):
         
         if 'code' in params:
             AuthHandler.code = params['code'][0]
+            AuthHandler.done.set()
             
             # Send a success message to the browser
             response = f"""
@@ -66,10 +79,10 @@ def open_strava_api_settings():
     
     click.pause("Press any key once you've created your Strava application...")
 
-def get_auth_code(client_id):
+def get_auth_code(client_id, scope=READ_SCOPE):
     """Get the authorization code by opening a browser window"""
-    # Strava authorization URL
-    auth_url = f"https://www.strava.com/oauth/authorize?client_id={client_id}&redirect_uri=http://localhost:8000&response_type=code&scope=activity:read_all"
+    # Strava authorization URL (the client id is encoded too, as it is pasted in by the user)
+    auth_url = f"{AUTHORIZE_URL}?{urlencode({'client_id': client_id, 'scope': scope})}&{AUTHORIZE_QUERY}"
     
     # Start a simple HTTP server to handle the callback
     server = HTTPServer(('localhost', 8000), AuthHandler)
@@ -77,34 +90,36 @@ def get_auth_code(client_id):
     server_thread.daemon = True
     server_thread.start()
     
-    # Open the browser for the user to authorize
-    click.echo("Opening browser for Strava authorization...")
-    webbrowser.open(auth_url)
-    
-    # Wait for the authorization code
-    start_time = time.time()
-    timeout = 120  # 2 minutes timeout
-    
-    with click.progressbar(
-        length=timeout, 
-        label='Waiting for authorization',
-        show_eta=False
-    ) as bar:
-        for i in range(timeout):
-            if AuthHandler.code is not None:
-                break
-            time.sleep(1)
-            bar.update(1)
-    
-    if AuthHandler.code is None:
-        click.echo("Authorization timed out. Please try again.")
+    try:
+        # Open the browser for the user to authorize
+        click.echo("Opening browser for Strava authorization...")
+        webbrowser.open(auth_url)
+        
+        # Wait for the authorization code
+        start_time = time.time()
+        timeout = 120  # 2 minutes timeout
+        
+        with click.progressbar(
+            length=timeout, 
+            label='Waiting for authorization',
+            show_eta=False
+        ) as bar:
+            # Waiting on the event returns as soon as the callback arrives instead of at the next poll
+            for i in range(timeout):
+                if AuthHandler.done.wait(1):
+                    break
+                bar.update(1)
+        
+        if AuthHandler.code is None:
+            click.echo("Authorization timed out. Please try again.")
+            return None
+        
+        return AuthHandler.code
+    finally:
+        # Stop the server and release its socket, also on timeout, errors or Ctrl+C
         server.shutdown()
-        return None
-    
-    # Shutdown the server
-    server.shutdown()
-    
-    return AuthHandler.code
+        server.server_close()
+        server_thread.join(timeout=2)
 
 def exchange_code_for_tokens(client_id, client_secret, code):
     """Exchange the authorization code for tokens"""
@@ -116,7 +131,15 @@ def exchange_code_for_tokens(client_id, client_secret, code):
         'grant_type': 'authorization_code'
     }
     
-    response = requests.post(token_url, data=payload)
+    # Only the token exchange talks HTTP, so requests is imported here rather than at startup
+    import requests
+    from src.strava_api import HTTP_TIMEOUT
+    
+    try:
+        response = requests.post(token_url, data=payload, timeout=HTTP_TIMEOUT)
+    except requests.RequestException as e:
+        click.echo(f"Error: {e}")
+        return None
     
     if response.status_code != 200:
         click.echo(f"Error: {response.status_code}")
@@ -129,11 +152,24 @@ def save_tokens(tokens, file_path='config/.env'):
     """Save tokens to the .env file"""
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
     
-    # Create or update the .env file
-    with open(file_path, 'w') as f:
+    # Create or update the .env file, via a temporary file so an interrupted write cannot
+    # leave a truncated configuration behind. It holds the client secret and tokens, so a new
+    # file is owner-only and a replaced one keeps its mode (never looser than before).
+    try:
+        mode = os.stat(file_path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o600
+    tmp_path = file_path + '.tmp'
+    with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+        # Also applies if a stale temporary file already existed with other permissions
+        os.chmod(tmp_path, mode)
         f.write(f"STRAVA_CLIENT_ID={tokens['client_id']}\n")
         f.write(f"STRAVA_CLIENT_SECRET={tokens['client_secret']}\n")
         f.write(f"STRAVA_REFRESH_TOKEN={tokens['refresh_token']}\n")
+        # The first access token, so the next run does not need to refresh it
+        f.write(f"STRAVA_ACCESS_TOKEN={tokens['access_token']}\n")
+        f.write(f"STRAVA_EXPIRES_AT={tokens['expires_at']}\n")
+    os.replace(tmp_path, file_path)
     
     click.echo(f"Tokens saved to {file_path}")
     
@@ -141,11 +177,13 @@ def save_tokens(tokens, file_path='config/.env'):
     os.environ['STRAVA_CLIENT_ID'] = str(tokens['client_id'])
     os.environ['STRAVA_CLIENT_SECRET'] = tokens['client_secret']
     os.environ['STRAVA_REFRESH_TOKEN'] = tokens['refresh_token']
+    os.environ['STRAVA_ACCESS_TOKEN'] = tokens['access_token']
+    os.environ['STRAVA_EXPIRES_AT'] = str(tokens['expires_at'])
     
     click.echo("Environment variables set for current session")
 
-def main():
-    """Main function to get and save Strava tokens"""
+def main(write=False):
+    """Main function to get and save Strava tokens, with write access to activities if asked"""
     click.echo(click.style("=== Strava Authentication Helper ===", fg="green", bold=True))
     click.echo("This script will help you set up Strava API authentication")
     click.echo("for the Cycling Coach application.")
@@ -153,7 +191,8 @@ def main():
     # Check if .env file already exists
     if os.path.exists('config/.env'):
         click.echo("\nFound existing configuration file.")
-        use_existing = click.confirm("Would you like to use existing credentials?", default=True)
+        # Existing tokens may lack write access, so re-authorizing is the default when it is asked for
+        use_existing = click.confirm("Would you like to use existing credentials?", default=not write)
         if use_existing:
             click.echo("Using existing credentials.")
             return
@@ -171,7 +210,7 @@ def main():
     
     # Step 3: Get authorization code
     click.echo("\nStep 3: Authorizing with Strava")
-    auth_code = get_auth_code(client_id)
+    auth_code = get_auth_code(client_id, WRITE_SCOPE if write else READ_SCOPE)
     
     if auth_code:
         click.echo(f"Authorization code received: {auth_code}")